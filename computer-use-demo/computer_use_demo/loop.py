@@ -256,7 +256,7 @@ def _make_api_tool_result(
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/png",
+                        "media_type": _image_media_type(result.base64_image),
                         "data": result.base64_image,
                     },
                 }
@@ -269,6 +269,14 @@ def _make_api_tool_result(
     }
 
 
+def _image_media_type(base64_image: str):
+    """Infer the media type of a base64 encoded image from its magic bytes."""
+    # base64 of the JPEG SOI marker (FF D8 FF)
+    if base64_image.startswith("/9j/"):
+        return "image/jpeg"
+    return "image/png"
+
+
 def _maybe_prepend_system_tool_result(result: ToolResult, result_text: str):
     if result.system:
         result_text = f"<system>{result.system}</system>\n{result_text}"
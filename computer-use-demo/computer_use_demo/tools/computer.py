@@ -1,25 +1,62 @@
 import asyncio
-import base64
+import binascii
 import io
+import logging
 import os
+import re
+import threading
+import time
+from collections.abc import Callable, Coroutine
 from pathlib import Path
-from typing import Literal, TypedDict
+from typing import Any, Literal, TypedDict, cast
 from uuid import uuid4
 import tempfile
 
 import pyautogui
+import pyperclip
 from anthropic.types.beta import BetaToolComputerUse20241022Param
 from mss import mss
-from PIL import Image
+from PIL import Image, __version__ as PIL_VERSION, features
+
+try:
+    import Quartz  # pyright: ignore[reportMissingImports]
+except ImportError:  # not on macOS, or pyobjc is not installed
+    Quartz = None
 
 from .base import BaseAnthropicTool, ToolError, ToolResult
 from .run import run
 
+logger = logging.getLogger(__name__)
+
 OUTPUT_DIR = Path(tempfile.gettempdir()) / "outputs"
 
 TYPING_DELAY_MS = 12
 TYPING_GROUP_SIZE = 50
 
+# Characters that must be sent as key presses rather than pasted.
+_PASTE_CONTROL_KEYS = {"\r\n": "enter", "\n": "enter", "\r": "enter", "\t": "tab"}
+_PASTE_CONTROL_RE = re.compile(r"(\r\n|[\r\n\t])")
+# Time the target app gets to read the pasteboard after Cmd+V
+PASTE_SETTLE_S = 0.05
+# Rough cost of each pasted segment or Return/Tab press, dominated by
+# pyautogui's default 0.1s post-call pause plus PASTE_SETTLE_S
+PASTE_SEGMENT_COST_S = 0.15
+
+# zlib level used when encoding screenshots. The image is held in memory and sent
+# once, so favour encode speed over size; bump via CUD_PNG_LEVEL when bandwidth matters.
+PNG_COMPRESS_LEVEL = 1
+
+# The model only needs a perceptual view of the screen, so JPEG is both far cheaper
+# to encode and far smaller than PNG. Set CUD_SCREENSHOT_FMT=png to get lossless images.
+ScreenshotFormat = Literal["JPEG", "PNG"]
+SCREENSHOT_FORMAT: ScreenshotFormat = "JPEG"
+JPEG_QUALITY = 80
+
+# Filter used to downscale screenshots to the target resolution. BILINEAR is
+# indistinguishable from LANCZOS for the model at a fraction of the cost; override
+# with CUD_RESAMPLE (e.g. box, lanczos).
+RESAMPLE = "BILINEAR"
+
 Action = Literal[
     "key",
     "type",
@@ -43,6 +80,56 @@ def chunks(s: str, chunk_size: int) -> list[str]:
     return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
 
 
+def paste_is_faster(text: str) -> bool:
+    """
+    Whether pasting text beats typing it. Every line break or tab splits the paste
+    into another segment, so text dense in them (TSV, short code lines) types faster.
+    """
+    segments = sum(1 for segment in _PASTE_CONTROL_RE.split(text) if segment)
+    return segments * PASTE_SEGMENT_COST_S < len(text) * TYPING_DELAY_MS / 1000
+
+
+def paste_text(text: str):
+    """
+    Enter text through the clipboard, pressing real Return/Tab keys for line breaks
+    and tabs as pyautogui.write would (a paste would insert them literally). The
+    user's clipboard is restored afterwards.
+    """
+    previous = pyperclip.paste()
+    try:
+        for segment in _PASTE_CONTROL_RE.split(text):
+            if segment in _PASTE_CONTROL_KEYS:
+                pyautogui.press(_PASTE_CONTROL_KEYS[segment])
+            elif segment:
+                pyperclip.copy(segment)
+                pyautogui.hotkey("command", "v")
+                # Give the target app time to read the pasteboard before it is
+                # overwritten; pyautogui.PAUSE may be 0.
+                time.sleep(PASTE_SETTLE_S)
+    finally:
+        time.sleep(PASTE_SETTLE_S)
+        pyperclip.copy(previous)
+
+
+def _is_bgrx(image_ref) -> bool:
+    """Whether a CGImage's pixels are laid out in memory as B, G, R, A/X bytes."""
+    assert Quartz is not None
+    bitmap_info = Quartz.CGImageGetBitmapInfo(image_ref)
+    byte_order = bitmap_info & Quartz.kCGBitmapByteOrderMask
+    alpha_info = bitmap_info & Quartz.kCGBitmapAlphaInfoMask
+    # 32-bit little-endian with alpha first stores each pixel as B, G, R, A
+    return (
+        Quartz.CGImageGetBitsPerPixel(image_ref) == 32
+        and byte_order == Quartz.kCGBitmapByteOrder32Little
+        and alpha_info
+        in (
+            Quartz.kCGImageAlphaPremultipliedFirst,
+            Quartz.kCGImageAlphaFirst,
+            Quartz.kCGImageAlphaNoneSkipFirst,
+        )
+    )
+
+
 class ComputerTool(BaseAnthropicTool):
     """
     A tool that allows the agent to interact with the screen, keyboard, and mouse of the current computer.
@@ -85,12 +172,62 @@ class ComputerTool(BaseAnthropicTool):
         self.x_scaling_factor = self.width / self.target_width  # Now dividing width by target_width
         self.y_scaling_factor = self.height / self.target_height  # Now dividing height by target_height
         
-        print(f"Screen resolution: {self.width}x{self.height}")
-        print(f"Target resolution: {self.target_width}x{self.target_height}")
-        print(f"Scaling factors: x={self.x_scaling_factor:.3f}, y={self.y_scaling_factor:.3f}")
+        logger.debug("Screen resolution: %dx%d", self.width, self.height)
+        logger.debug("Target resolution: %dx%d", self.target_width, self.target_height)
+        logger.debug(
+            "Scaling factors: x=%.3f, y=%.3f", self.x_scaling_factor, self.y_scaling_factor
+        )
+        logger.debug(
+            "Pillow %s (libjpeg-turbo: %s)",
+            PIL_VERSION,
+            features.check("libjpeg_turbo"),
+        )
         
-        # Initialize mss for screenshots
-        self.mss = mss()
+        # mss instances are not thread-safe, so each thread that takes screenshots
+        # lazily gets its own, along with a reusable encode buffer.
+        self._tls = threading.local()
+
+        png_level = os.getenv("CUD_PNG_LEVEL", str(PNG_COMPRESS_LEVEL))
+        try:
+            self._png_compress_level = int(png_level)
+        except ValueError:
+            raise ToolError(f"Invalid PNG compression level: {png_level}") from None
+        if not 0 <= self._png_compress_level <= 9:
+            raise ToolError(
+                f"PNG compression level must be between 0 and 9, got {png_level}"
+            )
+        screenshot_format = os.getenv("CUD_SCREENSHOT_FMT", SCREENSHOT_FORMAT).upper()
+        if screenshot_format not in ("JPEG", "PNG"):
+            raise ToolError(f"Unsupported screenshot format: {screenshot_format}")
+        self._screenshot_format = cast(ScreenshotFormat, screenshot_format)
+        # UI screenshots palettize well, which cuts the bytes zlib has to deflate.
+        self._png_palette = os.getenv("CUD_PALETTE") == "1"
+        resample = os.getenv("CUD_RESAMPLE", RESAMPLE).upper()
+        try:
+            self._resample = Image.Resampling[resample]
+        except KeyError:
+            raise ToolError(f"Unsupported resampling filter: {resample}") from None
+
+        self._click_functions: dict[str, Callable[[], None]] = {
+            "left_click": pyautogui.click,
+            "right_click": pyautogui.rightClick,
+            "middle_click": pyautogui.middleClick,
+            "double_click": lambda: pyautogui.click(clicks=2),
+        }
+        self._handlers: dict[
+            str, Callable[..., Coroutine[Any, Any, ToolResult]]
+        ] = {
+            "key": self._handle_key,
+            "type": self._handle_type,
+            "mouse_move": self._handle_mouse_move,
+            "left_click": self._handle_click,
+            "left_click_drag": self._handle_left_click_drag,
+            "right_click": self._handle_click,
+            "middle_click": self._handle_click,
+            "double_click": self._handle_click,
+            "screenshot": self._handle_screenshot,
+            "cursor_position": self._handle_cursor_position,
+        }
 
     async def __call__(
         self,
@@ -100,110 +237,209 @@ class ComputerTool(BaseAnthropicTool):
         coordinate: tuple[int, int] | None = None,
         **kwargs,
     ):
-        if action in ("mouse_move", "left_click_drag"):
-            if coordinate is None:
-                raise ToolError(f"coordinate is required for {action}")
-            if text is not None:
-                raise ToolError(f"text is not accepted for {action}")
-            if not isinstance(coordinate, list) or len(coordinate) != 2:
-                raise ToolError(f"{coordinate} must be a tuple of length 2")
-            if not all(isinstance(i, int) and i >= 0 for i in coordinate):
-                raise ToolError(f"{coordinate} must be a tuple of non-negative ints")
-
-            if coordinate[0] > self.width or coordinate[1] > self.height:
-                raise ToolError(f"Coordinates {coordinate[0]}, {coordinate[1]} are out of bounds")
-
-            x, y = self.scale_coordinates(coordinate[0], coordinate[1])
-
-            if action == "mouse_move":
-                pyautogui.moveTo(x, y)
-                return ToolResult()
-            elif action == "left_click_drag":
-                current_x, current_y = pyautogui.position()
-                pyautogui.mouseDown()
-                pyautogui.moveTo(x, y)
-                pyautogui.mouseUp()
-                return ToolResult()
-
-        if action in ("key", "type"):
-            if text is None:
-                raise ToolError(f"text is required for {action}")
-            if coordinate is not None:
-                raise ToolError(f"coordinate is not accepted for {action}")
-            if not isinstance(text, str):
-                raise ToolError(output=f"{text} must be a string")
-
-            if action == "key":
-                # Handle Mac-specific key combinations
-                if "Command" in text or "command" in text:
-                    # Convert "Command_L+q" or "command+q" to ["command", "q"]
-                    keys = text.lower().replace("_l", "").split("+")
-                    pyautogui.hotkey(*keys)
-                else:
-                    pyautogui.press(text)
-                return ToolResult()
-            elif action == "type":
-                pyautogui.write(text, interval=TYPING_DELAY_MS/1000)
-                return await self.screenshot()
-
-        if action in (
-            "left_click",
-            "right_click",
-            "double_click",
-            "middle_click",
-            "screenshot",
-            "cursor_position",
-        ):
-            if text is not None:
-                raise ToolError(f"text is not accepted for {action}")
-            if coordinate is not None:
-                raise ToolError(f"coordinate is not accepted for {action}")
-
-            if action == "screenshot":
-                return await self.screenshot()
-            elif action == "cursor_position":
-                x, y = pyautogui.position()
-                scaled_x, scaled_y = self.scale_coordinates(x, y)
-                return ToolResult(output=f"X={scaled_x},Y={scaled_y}")
-            else:
-                click_functions = {
-                    "left_click": pyautogui.click,
-                    "right_click": pyautogui.rightClick,
-                    "middle_click": pyautogui.middleClick,
-                    "double_click": lambda: pyautogui.click(clicks=2),
-                }
-                click_functions[action]()
-                return await self.screenshot()
-
-        raise ToolError(f"Invalid action: {action}")
+        try:
+            handler = self._handlers[action]
+        except KeyError:
+            raise ToolError(f"Invalid action: {action}") from None
+        return await handler(action, text, coordinate)
+
+    def _validate_coordinate_action(
+        self, action: Action, text: str | None, coordinate: tuple[int, int] | None
+    ) -> tuple[int, int]:
+        """Validate arguments for a coordinate action and return the scaled coordinate."""
+        if coordinate is None:
+            raise ToolError(f"coordinate is required for {action}")
+        if text is not None:
+            raise ToolError(f"text is not accepted for {action}")
+        if not isinstance(coordinate, list) or len(coordinate) != 2:
+            raise ToolError(f"{coordinate} must be a tuple of length 2")
+        if not all(isinstance(i, int) and i >= 0 for i in coordinate):
+            raise ToolError(f"{coordinate} must be a tuple of non-negative ints")
+
+        if coordinate[0] > self.width or coordinate[1] > self.height:
+            raise ToolError(f"Coordinates {coordinate[0]}, {coordinate[1]} are out of bounds")
+
+        return self.scale_coordinates(coordinate[0], coordinate[1])
+
+    def _validate_text_action(
+        self, action: Action, text: str | None, coordinate: tuple[int, int] | None
+    ) -> str:
+        """Validate arguments for a text action and return the text."""
+        if text is None:
+            raise ToolError(f"text is required for {action}")
+        if coordinate is not None:
+            raise ToolError(f"coordinate is not accepted for {action}")
+        if not isinstance(text, str):
+            raise ToolError(f"{text} must be a string")
+        return text
+
+    def _validate_no_args_action(
+        self, action: Action, text: str | None, coordinate: tuple[int, int] | None
+    ):
+        """Validate that an action received neither text nor a coordinate."""
+        if text is not None:
+            raise ToolError(f"text is not accepted for {action}")
+        if coordinate is not None:
+            raise ToolError(f"coordinate is not accepted for {action}")
+
+    async def _handle_mouse_move(self, action, text, coordinate):
+        x, y = self._validate_coordinate_action(action, text, coordinate)
+        pyautogui.moveTo(x, y)
+        return ToolResult()
+
+    async def _handle_left_click_drag(self, action, text, coordinate):
+        x, y = self._validate_coordinate_action(action, text, coordinate)
+        pyautogui.mouseDown()
+        pyautogui.moveTo(x, y)
+        pyautogui.mouseUp()
+        return ToolResult()
+
+    async def _handle_key(self, action, text, coordinate):
+        text = self._validate_text_action(action, text, coordinate)
+        # Handle Mac-specific key combinations
+        if "Command" in text or "command" in text:
+            # Convert "Command_L+q" or "command+q" to ["command", "q"]
+            keys = text.lower().replace("_l", "").split("+")
+            pyautogui.hotkey(*keys)
+        else:
+            pyautogui.press(text)
+        return ToolResult()
+
+    async def _handle_type(self, action, text, coordinate):
+        text = self._validate_text_action(action, text, coordinate)
+        if len(text) > TYPING_GROUP_SIZE and paste_is_faster(text):
+            # Typing sends one key event per character, so paste long text
+            # instead. This also sidesteps macOS auto-correct.
+            await asyncio.to_thread(paste_text, text)
+        else:
+            # Short or full of line breaks/tabs; type it off the event loop.
+            await asyncio.to_thread(
+                pyautogui.write, text, interval=TYPING_DELAY_MS / 1000
+            )
+        return await self.screenshot()
+
+    async def _handle_click(self, action, text, coordinate):
+        self._validate_no_args_action(action, text, coordinate)
+        # Let the UI settle before capturing, overlapping the wait with the click
+        # itself (including pyautogui's post-call pause).
+        await asyncio.gather(
+            asyncio.to_thread(self._click_functions[action]),
+            asyncio.sleep(self._screenshot_delay),
+        )
+        return await self.screenshot()
+
+    async def _handle_screenshot(self, action, text, coordinate):
+        self._validate_no_args_action(action, text, coordinate)
+        return await self.screenshot()
+
+    async def _handle_cursor_position(self, action, text, coordinate):
+        self._validate_no_args_action(action, text, coordinate)
+        x, y = pyautogui.position()
+        scaled_x, scaled_y = self.scale_coordinates(x, y)
+        return ToolResult(output=f"X={scaled_x},Y={scaled_y}")
 
     def scale_coordinates(self, x: int, y: int) -> tuple[int, int]:
         """Scale coordinates FROM target resolution TO actual screen resolution."""
         if not self._scaling_enabled:
             return x, y
-            
-        scaled_x = round(x * self.x_scaling_factor)  # Now scaling up instead of down
-        scaled_y = round(y * self.y_scaling_factor)
-        
-        print(f"Scaling coordinates: ({x}, {y}) -> ({scaled_x}, {scaled_y})")
-        return scaled_x, scaled_y
+
+        # x * width / target_width rounded half up, in exact integer arithmetic
+        return (
+            (2 * x * self.width + self.target_width) // (2 * self.target_width),
+            (2 * y * self.height + self.target_height) // (2 * self.target_height),
+        )
+
+    def _get_mss(self):
+        """Return the mss instance for the current thread, creating it on first use."""
+        sct = getattr(self._tls, "mss", None)
+        if sct is None:
+            sct = self._tls.mss = mss()
+        return sct
+
+    def _get_buffer(self) -> io.BytesIO:
+        """Return the current thread's encode buffer, emptied for reuse."""
+        buffer = getattr(self._tls, "buffer", None)
+        if buffer is None:
+            buffer = self._tls.buffer = io.BytesIO()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return buffer
 
     async def screenshot(self):
         """Take a screenshot of the current screen and return the base64 encoded image."""
-        # Capture the primary monitor
-        screenshot = self.mss.grab(self.mss.monitors[1])  # monitor 1 is the primary
-        
-        # Convert to PIL Image
-        img = Image.frombytes('RGB', screenshot.size, screenshot.rgb)
-        print(f"Captured image resolution: {img.size[0]}x{img.size[1]}")
+        # Capture and encoding are CPU-bound, so keep them off the event loop.
+        base64_image = await asyncio.to_thread(self._screenshot_sync)
+        return ToolResult(base64_image=base64_image)
+
+    def _capture_macos(self) -> Image.Image | None:
+        """
+        Capture the main display with CoreGraphics, or return None if unavailable.
+        Pillow decodes straight from the CGImage's backing data, skipping the copy
+        mss makes to strip row padding.
+        """
+        if Quartz is None:
+            return None
+        display = Quartz.CGMainDisplayID()
+        # Have the compositor render at the nominal (point) resolution, which on a
+        # Retina display is a quarter of the pixels of a native capture.
+        image_ref = Quartz.CGWindowListCreateImage(
+            Quartz.CGDisplayBounds(display),
+            Quartz.kCGWindowListOptionOnScreenOnly,
+            Quartz.kCGNullWindowID,
+            Quartz.kCGWindowImageNominalResolution,
+        )
+        if image_ref is None:
+            image_ref = Quartz.CGDisplayCreateImage(display)
+        if image_ref is None or not _is_bgrx(image_ref):
+            return None
+        data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image_ref))
+        size = (Quartz.CGImageGetWidth(image_ref), Quartz.CGImageGetHeight(image_ref))
+        stride = Quartz.CGImageGetBytesPerRow(image_ref)
+        return Image.frombuffer('RGB', size, data, 'raw', 'BGRX', stride, 1)
+
+    def _capture_mss(self) -> Image.Image:
+        """Capture the primary monitor with mss."""
+        sct = self._get_mss()
+        screenshot = sct.grab(sct.monitors[1])  # monitor 1 is the primary
+
+        # Decoding the raw BGRA buffer directly avoids having mss build an
+        # intermediate RGB copy of the whole frame.
+        return Image.frombytes('RGB', screenshot.size, screenshot.bgra, 'raw', 'BGRX')
+
+    def _screenshot_sync(self) -> str:
+        """Capture, scale and encode the primary monitor, returning base64 image data."""
+        img = self._capture_macos()
+        if img is None:
+            img = self._capture_mss()
+        logger.debug("Captured image resolution: %dx%d", *img.size)
         
-        if self._scaling_enabled:
-            img = img.resize((self.target_width, self.target_height), Image.Resampling.LANCZOS)
-            print(f"Scaled image to: {self.target_width}x{self.target_height}")
+        target_size = (self.target_width, self.target_height)
+        if self._scaling_enabled and img.size != target_size:
+            # reducing_gap first box-reduces by an integer factor, then interpolates
+            # the remainder. Unlike thumbnail() this keeps the exact target size that
+            # scale_coordinates relies on.
+            img = img.resize(target_size, self._resample, reducing_gap=2.0)
+            logger.debug("Scaled image to: %dx%d", *target_size)
         
         # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        base64_image = base64.b64encode(buffer.getvalue()).decode()
-        
-        return ToolResult(base64_image=base64_image)
+        buffer = self._get_buffer()
+        if self._screenshot_format == "JPEG":
+            img.save(
+                buffer,
+                format='JPEG',
+                quality=JPEG_QUALITY,
+                optimize=False,
+                progressive=False,
+            )
+        else:
+            if self._png_palette:
+                img = img.convert('P', palette=Image.Palette.ADAPTIVE, colors=256)
+            img.save(
+                buffer,
+                format='PNG',
+                compress_level=self._png_compress_level,
+                optimize=False,
+            )
+        # Encode straight from the buffer's memory rather than a getvalue() copy.
+        with buffer.getbuffer() as data:
+            return binascii.b2a_base64(data, newline=False).decode('ascii')
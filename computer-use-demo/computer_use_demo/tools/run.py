@@ -1,68 +1,155 @@
 """Utility to run async operations and shell commands with timeout."""
 
 import asyncio
-from typing import Any, Callable, TypeVar, Union, Tuple
+import concurrent.futures
+import contextvars
+import functools
+import os
+import shlex
+import signal
+from typing import Any, Callable, TypeVar, Union, Tuple, cast
 
 T = TypeVar('T')
 
+# Shared executor for sync callables, so each call reuses warm worker threads.
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+# Characters that need a real shell to interpret; commands without any of them can
+# be exec'd directly.
+_SHELL_METACHARACTERS = frozenset("|&;<>()$`\\\"'*?[]#~=%{}!\n")
+
 TRUNCATED_MESSAGE: str = "<response clipped><NOTE>Response was truncated to save context.</NOTE>"
 MAX_RESPONSE_LEN: int = 16000
 
+_READ_CHUNK_SIZE = 64 * 1024
 
-def maybe_truncate(content: str, truncate_after: int | None = MAX_RESPONSE_LEN) -> str:
-    """Truncate content and append a notice if content exceeds the specified length."""
-    return (
-        content
-        if not truncate_after or len(content) <= truncate_after
-        else content[:truncate_after] + TRUNCATED_MESSAGE
-    )
+
+def maybe_truncate(
+    content: str | bytes, truncate_after: int | None = MAX_RESPONSE_LEN
+) -> str:
+    """
+    Truncate content and append a notice if content exceeds the specified length.
+    Bytes are truncated before being decoded as UTF-8, so only the retained prefix
+    is ever decoded.
+    """
+    truncated = bool(truncate_after) and len(content) > truncate_after
+    if truncated:
+        content = content[:truncate_after]
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    return content + TRUNCATED_MESSAGE if truncated else content
 
 
 async def run_shell(
     cmd: str,
     timeout: float | None = 120.0,  # seconds
     truncate_after: int | None = MAX_RESPONSE_LEN,
+    shell: bool = True,
 ) -> Tuple[int, str, str]:
-    """Run a shell command asynchronously with a timeout."""
-    process = await asyncio.create_subprocess_shell(
-        cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
+    """
+    Run a shell command asynchronously with a timeout.
+
+    With `shell=False`, commands free of shell metacharacters are exec'd directly,
+    skipping the /bin/sh fork; anything else still goes through the shell.
+    """
+    # Run in a new session so a timeout kills the whole process group (e.g. every
+    # stage of a pipeline), closing the pipes we are reading from.
+    popen_kwargs: dict[str, Any] = {
+        "stdout": asyncio.subprocess.PIPE,
+        "stderr": asyncio.subprocess.PIPE,
+        "start_new_session": True,
+    }
+    process = None
+    argv = shlex.split(cmd) if not shell and _SHELL_METACHARACTERS.isdisjoint(cmd) else []
+    if argv:
+        try:
+            process = await asyncio.create_subprocess_exec(*argv, **popen_kwargs)
+        except OSError:
+            # e.g. a shell builtin or a non-executable path; let the shell resolve
+            # it and report errors
+            pass
+    if process is None:
+        process = await asyncio.create_subprocess_shell(cmd, **popen_kwargs)
+
+    # One byte past the cap is enough for maybe_truncate to know it truncated.
+    limit = truncate_after + 1 if truncate_after else None
+
+    def kill():
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def communicate() -> Tuple[bytes, bytes]:
+        assert process.stdout and process.stderr
+        stdout, stderr = await asyncio.gather(
+            _read_capped(process.stdout, limit),
+            _read_capped(process.stderr, limit),
+        )
+        await process.wait()
+        return stdout, stderr
 
     try:
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        stdout, stderr = await asyncio.wait_for(communicate(), timeout=timeout)
         return (
             process.returncode or 0,
-            maybe_truncate(stdout.decode(), truncate_after=truncate_after),
-            maybe_truncate(stderr.decode(), truncate_after=truncate_after),
+            maybe_truncate(stdout, truncate_after=truncate_after),
+            maybe_truncate(stderr, truncate_after=truncate_after),
         )
     except asyncio.TimeoutError as exc:
-        try:
-            process.kill()
-        except ProcessLookupError:
-            pass
+        kill()
         raise TimeoutError(
             f"Command '{cmd}' timed out after {timeout} seconds"
         ) from exc
 
 
+async def _read_capped(stream: asyncio.StreamReader, limit: int | None) -> bytes:
+    """
+    Read a stream to EOF, keeping at most `limit` bytes. The rest is drained and
+    discarded so the process can run to completion without holding it in memory.
+    """
+    data = bytearray()
+    while chunk := await stream.read(_READ_CHUNK_SIZE):
+        if limit is None or len(data) < limit:
+            data += chunk
+            if limit is not None and len(data) > limit:
+                del data[limit:]
+    return bytes(data)
+
+
 async def run(
     operation: Union[str, Callable[..., T]],
     *args: Any,
     timeout: float | None = 120.0,  # seconds
     truncate_after: int | None = MAX_RESPONSE_LEN,
+    shell: bool = True,
+    inline: bool = False,
     **kwargs: Any,
 ) -> Union[Tuple[int, str, str], T]:
     """
     Run an operation with a timeout. The operation can be either:
     - A shell command (string)
     - A callable (sync or async function)
+
+    With `inline=True`, a sync callable is called directly on the event loop with
+    no thread hop and no timeout. Only use it for cheap, non-blocking work.
+
+    `timeout`, `truncate_after`, `shell` and `inline` are consumed by `run` itself
+    and are never forwarded to the callable; wrap it (e.g. in functools.partial) to
+    pass it arguments with those names.
     """
     if isinstance(operation, str):
-        return await run_shell(operation, timeout=timeout, truncate_after=truncate_after)
+        return await run_shell(
+            operation, timeout=timeout, truncate_after=truncate_after, shell=shell
+        )
+
+    # Check through a cast so pyright doesn't narrow `operation` for the code below
+    if inline and not asyncio.iscoroutinefunction(cast(Any, operation)):
+        return operation(*args, **kwargs)
     
     try:
         result = await asyncio.wait_for(
-            operation(*args, **kwargs) if asyncio.iscoroutine(operation) else asyncio.to_thread(operation, *args, **kwargs),
+            operation(*args, **kwargs) if asyncio.iscoroutine(operation) else _run_in_executor(operation, *args, **kwargs),
             timeout=timeout
         )
         return result
@@ -70,3 +157,11 @@ async def run(
         raise TimeoutError(
             f"Operation timed out after {timeout} seconds"
         ) from exc
+
+
+def _run_in_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> "asyncio.Future[T]":
+    """Like asyncio.to_thread, but on the shared module executor."""
+    ctx = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(
+        _EXECUTOR, functools.partial(ctx.run, func, *args, **kwargs)
+    )
@@ -1,8 +1,15 @@
 import os
+import sys
 from unittest import mock
 
 import pytest
 
+try:
+    import pyautogui  # noqa: F401
+except Exception:
+    # pyautogui needs a display to import on Linux; tests patch it where it is used
+    sys.modules["pyautogui"] = mock.MagicMock()
+
 
 @pytest.fixture(autouse=True)
 def mock_screen_dimensions():
@@ -3,7 +3,8 @@ from unittest import mock
 from anthropic.types import TextBlock, ToolUseBlock
 from anthropic.types.beta import BetaMessage, BetaMessageParam, BetaTextBlockParam
 
-from computer_use_demo.loop import APIProvider, sampling_loop
+from computer_use_demo.loop import _make_api_tool_result, sampling_loop
+from computer_use_demo.tools import ToolResult
 
 
 async def test_loop():
@@ -35,11 +36,10 @@ async def test_loop():
         "computer_use_demo.loop.Anthropic", return_value=client
     ), mock.patch(
         "computer_use_demo.loop.ToolCollection", return_value=tool_collection
-    ):
+    ), mock.patch("computer_use_demo.loop.ComputerTool"):
         messages: list[BetaMessageParam] = [{"role": "user", "content": "Test message"}]
         result = await sampling_loop(
             model="test-model",
-            provider=APIProvider.ANTHROPIC,
             system_prompt_suffix="",
             messages=messages,
             output_callback=output_callback,
@@ -64,3 +64,11 @@ async def test_loop():
         assert output_callback.call_count == 3
         assert tool_output_callback.call_count == 1
         assert api_response_callback.call_count == 2
+
+
+def test_make_api_tool_result_image_media_type():
+    jpeg = _make_api_tool_result(ToolResult(base64_image="/9j/4AAQSkZJRg"), "1")
+    assert jpeg["content"][0]["source"]["media_type"] == "image/jpeg"
+
+    png = _make_api_tool_result(ToolResult(base64_image="iVBORw0KGgo"), "2")
+    assert png["content"][0]["source"]["media_type"] == "image/png"
@@ -1,124 +1,165 @@
-from unittest.mock import AsyncMock, patch
+import base64
+import io
+import re
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 import pytest
+from PIL import Image
 
 from computer_use_demo.tools.computer import (
+    TYPING_GROUP_SIZE,
     ComputerTool,
-    ScalingSource,
     ToolError,
     ToolResult,
 )
 
 
 @pytest.fixture
-def computer_tool():
-    return ComputerTool()
+def mock_pyautogui():
+    with patch("computer_use_demo.tools.computer.pyautogui") as mock_pyautogui:
+        # MacBook Pro 14" default scaled resolution
+        mock_pyautogui.size.return_value = (1512, 982)
+        mock_pyautogui.position.return_value = (756, 491)
+        yield mock_pyautogui
 
 
-@pytest.mark.asyncio
-async def test_computer_tool_mouse_move(computer_tool):
-    with patch.object(computer_tool, "shell", new_callable=AsyncMock) as mock_shell:
-        mock_shell.return_value = ToolResult(output="Mouse moved")
-        result = await computer_tool(action="mouse_move", coordinate=[100, 200])
-        mock_shell.assert_called_once_with(
-            f"{computer_tool.xdotool} mousemove --sync 100 200"
-        )
-        assert result.output == "Mouse moved"
+@pytest.fixture
+def mock_pyperclip():
+    with patch("computer_use_demo.tools.computer.pyperclip") as mock_pyperclip:
+        mock_pyperclip.paste.return_value = "user clipboard"
+        yield mock_pyperclip
 
 
-@pytest.mark.asyncio
-async def test_computer_tool_type(computer_tool):
-    with (
-        patch.object(computer_tool, "shell", new_callable=AsyncMock) as mock_shell,
-        patch.object(
-            computer_tool, "screenshot", new_callable=AsyncMock
-        ) as mock_screenshot,
-    ):
-        mock_shell.return_value = ToolResult(output="Text typed")
-        mock_screenshot.return_value = ToolResult(base64_image="base64_screenshot")
-        result = await computer_tool(action="type", text="Hello, World!")
-        assert mock_shell.call_count == 1
-        assert "type --delay 12 -- 'Hello, World!'" in mock_shell.call_args[0][0]
-        assert result.output == "Text typed"
-        assert result.base64_image == "base64_screenshot"
+@pytest.fixture
+def computer_tool(mock_pyautogui):
+    tool = ComputerTool()
+    tool._screenshot_delay = 0
+    return tool
 
 
-@pytest.mark.asyncio
-async def test_computer_tool_screenshot(computer_tool):
+@pytest.fixture
+def mock_screenshot(computer_tool):
     with patch.object(
         computer_tool, "screenshot", new_callable=AsyncMock
     ) as mock_screenshot:
         mock_screenshot.return_value = ToolResult(base64_image="base64_screenshot")
-        result = await computer_tool(action="screenshot")
-        mock_screenshot.assert_called_once()
-        assert result.base64_image == "base64_screenshot"
+        yield mock_screenshot
 
 
 @pytest.mark.asyncio
-async def test_computer_tool_scaling(computer_tool):
-    computer_tool._scaling_enabled = True
-    computer_tool.width = 1920
-    computer_tool.height = 1080
+async def test_computer_tool_mouse_move(computer_tool, mock_pyautogui):
+    result = await computer_tool(action="mouse_move", coordinate=[640, 400])
+    mock_pyautogui.moveTo.assert_called_once_with(756, 491)
+    assert result == ToolResult()
 
-    # Test scaling from API to computer
-    x, y = computer_tool.scale_coordinates(ScalingSource.API, 1366, 768)
-    assert x == 1920
-    assert y == 1080
 
-    # Test scaling from computer to API
-    x, y = computer_tool.scale_coordinates(ScalingSource.COMPUTER, 1920, 1080)
-    assert x == 1366
-    assert y == 768
+@pytest.mark.asyncio
+async def test_computer_tool_left_click_drag(computer_tool, mock_pyautogui):
+    await computer_tool(action="left_click_drag", coordinate=[1280, 800])
+    mock_pyautogui.mouseDown.assert_called_once()
+    mock_pyautogui.moveTo.assert_called_once_with(1512, 982)
+    mock_pyautogui.mouseUp.assert_called_once()
 
-    # Test no scaling when disabled
-    computer_tool._scaling_enabled = False
-    x, y = computer_tool.scale_coordinates(ScalingSource.API, 1366, 768)
-    assert x == 1366
-    assert y == 768
+
+@pytest.mark.asyncio
+async def test_computer_tool_key(computer_tool, mock_pyautogui):
+    await computer_tool(action="key", text="Return")
+    mock_pyautogui.press.assert_called_once_with("Return")
+
+    await computer_tool(action="key", text="Command_L+q")
+    mock_pyautogui.hotkey.assert_called_once_with("command", "q")
 
 
 @pytest.mark.asyncio
-async def test_computer_tool_scaling_with_different_aspect_ratio(computer_tool):
-    computer_tool._scaling_enabled = True
-    computer_tool.width = 1920
-    computer_tool.height = 1200  # 16:10 aspect ratio
+async def test_computer_tool_type_short_text(
+    computer_tool, mock_pyautogui, mock_pyperclip, mock_screenshot
+):
+    result = await computer_tool(action="type", text="Hello, World!")
+    mock_pyautogui.write.assert_called_once_with("Hello, World!", interval=0.012)
+    mock_pyperclip.copy.assert_not_called()
+    assert result.base64_image == "base64_screenshot"
 
-    # Test scaling from API to computer
-    x, y = computer_tool.scale_coordinates(ScalingSource.API, 1280, 800)
-    assert x == 1920
-    assert y == 1200
 
-    # Test scaling from computer to API
-    x, y = computer_tool.scale_coordinates(ScalingSource.COMPUTER, 1920, 1200)
-    assert x == 1280
-    assert y == 800
+@pytest.mark.asyncio
+async def test_computer_tool_type_long_text_pastes(
+    computer_tool, mock_pyautogui, mock_pyperclip, mock_screenshot
+):
+    first = "a" * TYPING_GROUP_SIZE
+    second = "b" * 10
+    result = await computer_tool(action="type", text=f"{first}\t{second}\n")
+
+    mock_pyautogui.write.assert_not_called()
+    # control characters are real key presses, not pasted
+    assert mock_pyautogui.press.call_args_list == [call("tab"), call("enter")]
+    assert mock_pyautogui.hotkey.call_args_list == [call("command", "v")] * 2
+    # the user's clipboard is restored afterwards
+    assert mock_pyperclip.copy.call_args_list == [
+        call(first),
+        call(second),
+        call("user clipboard"),
+    ]
+    assert result.base64_image == "base64_screenshot"
 
 
 @pytest.mark.asyncio
-async def test_computer_tool_no_scaling_for_unsupported_resolution(computer_tool):
-    computer_tool._scaling_enabled = True
-    computer_tool.width = 4096
-    computer_tool.height = 2160
+async def test_computer_tool_type_dense_control_characters_types(
+    computer_tool, mock_pyautogui, mock_pyperclip, mock_screenshot
+):
+    # one paste per line would cost far more than typing it
+    text = "a\n" * 30
+    await computer_tool(action="type", text=text)
+    mock_pyautogui.write.assert_called_once_with(text, interval=0.012)
+    mock_pyperclip.copy.assert_not_called()
 
-    # Test no scaling for unsupported resolution
-    x, y = computer_tool.scale_coordinates(ScalingSource.API, 4096, 2160)
-    assert x == 4096
-    assert y == 2160
 
-    x, y = computer_tool.scale_coordinates(ScalingSource.COMPUTER, 4096, 2160)
-    assert x == 4096
-    assert y == 2160
+@pytest.mark.asyncio
+async def test_computer_tool_click(computer_tool, mock_pyautogui, mock_screenshot):
+    result = await computer_tool(action="left_click")
+    mock_pyautogui.click.assert_called_once_with()
+    mock_screenshot.assert_awaited_once()
+    assert result.base64_image == "base64_screenshot"
+
+    await computer_tool(action="double_click")
+    mock_pyautogui.click.assert_called_with(clicks=2)
 
 
 @pytest.mark.asyncio
-async def test_computer_tool_scaling_out_of_bounds(computer_tool):
-    computer_tool._scaling_enabled = True
-    computer_tool.width = 1920
-    computer_tool.height = 1080
+async def test_computer_tool_click_waits_for_settle_delay(
+    computer_tool, mock_screenshot
+):
+    computer_tool._screenshot_delay = 0.5
+    with patch(
+        "computer_use_demo.tools.computer.asyncio.sleep", new_callable=AsyncMock
+    ) as mock_sleep:
+        await computer_tool(action="right_click")
+    mock_sleep.assert_awaited_once_with(0.5)
+    mock_screenshot.assert_awaited_once()
+
 
-    # Test scaling from API with out of bounds coordinates
-    with pytest.raises(ToolError, match="Coordinates .*, .* are out of bounds"):
-        x, y = computer_tool.scale_coordinates(ScalingSource.API, 2000, 1500)
+@pytest.mark.asyncio
+async def test_computer_tool_screenshot(computer_tool, mock_screenshot):
+    result = await computer_tool(action="screenshot")
+    mock_screenshot.assert_awaited_once()
+    assert result.base64_image == "base64_screenshot"
+
+
+@pytest.mark.asyncio
+async def test_computer_tool_cursor_position(computer_tool):
+    result = await computer_tool(action="cursor_position")
+    assert result.output is not None
+    assert re.fullmatch(r"X=\d+,Y=\d+", result.output)
+
+
+def test_computer_tool_scaling(computer_tool):
+    assert computer_tool.scale_coordinates(0, 0) == (0, 0)
+    assert computer_tool.scale_coordinates(640, 400) == (756, 491)
+    assert computer_tool.scale_coordinates(1280, 800) == (1512, 982)
+    # 200 * 982 / 800 = 245.5 rounds half up
+    assert computer_tool.scale_coordinates(100, 200) == (118, 246)
+
+    computer_tool._scaling_enabled = False
+    assert computer_tool.scale_coordinates(640, 400) == (640, 400)
 
 
 @pytest.mark.asyncio
@@ -133,7 +174,261 @@ async def test_computer_tool_missing_coordinate(computer_tool):
         await computer_tool(action="mouse_move")
 
 
+@pytest.mark.asyncio
+async def test_computer_tool_invalid_coordinate(computer_tool):
+    with pytest.raises(ToolError, match="must be a tuple of non-negative ints"):
+        await computer_tool(action="mouse_move", coordinate=[-1, 10])
+    with pytest.raises(ToolError, match="text is not accepted for left_click_drag"):
+        await computer_tool(action="left_click_drag", coordinate=[1, 1], text="x")
+
+
 @pytest.mark.asyncio
 async def test_computer_tool_missing_text(computer_tool):
     with pytest.raises(ToolError, match="text is required for type"):
         await computer_tool(action="type")
+
+
+@pytest.mark.asyncio
+async def test_computer_tool_non_string_text(computer_tool):
+    with pytest.raises(ToolError, match="123 must be a string"):
+        await computer_tool(action="key", text=123)
+
+
+@pytest.mark.asyncio
+async def test_computer_tool_unexpected_arguments(computer_tool):
+    with pytest.raises(ToolError, match="coordinate is not accepted for key"):
+        await computer_tool(action="key", text="a", coordinate=[1, 1])
+    with pytest.raises(ToolError, match="text is not accepted for screenshot"):
+        await computer_tool(action="screenshot", text="a")
+
+
+@pytest.mark.parametrize("level", ["fast", "10", "-1"])
+def test_computer_tool_invalid_png_level(mock_pyautogui, monkeypatch, level):
+    monkeypatch.setenv("CUD_PNG_LEVEL", level)
+    with pytest.raises(ToolError):
+        ComputerTool()
+
+
+def make_mss(frame: Image.Image):
+    """An mss stand-in whose grab() returns frame as raw BGRA, like mss does."""
+    shot = SimpleNamespace(
+        size=frame.size, bgra=frame.convert("RGBA").tobytes("raw", "BGRA")
+    )
+    sct = MagicMock(monitors=[{}, {}])
+    sct.grab.return_value = shot
+    return sct
+
+
+@pytest.fixture
+def capture_frame(computer_tool):
+    """Route captures of computer_tool through mss with a synthetic frame."""
+    sct = make_mss(Image.new("RGB", (1512, 982), (255, 0, 0)))
+    with (
+        patch("computer_use_demo.tools.computer.Quartz", None),
+        patch.object(computer_tool, "_get_mss", return_value=sct),
+    ):
+
+        def set_frame(frame: Image.Image):
+            sct.grab.return_value = make_mss(frame).grab.return_value
+
+        yield set_frame
+
+
+def decode(base64_image: str | None) -> Image.Image:
+    assert base64_image is not None
+    img = Image.open(io.BytesIO(base64.b64decode(base64_image, validate=True)))
+    img.load()
+    return img
+
+
+@pytest.mark.asyncio
+async def test_computer_tool_screenshot_jpeg(computer_tool, capture_frame):
+    result = await computer_tool(action="screenshot")
+    img = decode(result.base64_image)
+    assert img.format == "JPEG"
+    assert img.size == (1280, 800)
+    # BGRA is decoded to RGB without swapping channels
+    r, g, b = img.getpixel((640, 400))
+    assert r > 240 and g < 15 and b < 15
+
+
+@pytest.mark.asyncio
+async def test_computer_tool_screenshot_png(mock_pyautogui, monkeypatch):
+    monkeypatch.setenv("CUD_SCREENSHOT_FMT", "png")
+    computer_tool = ComputerTool()
+    with (
+        patch("computer_use_demo.tools.computer.Quartz", None),
+        patch.object(
+            computer_tool,
+            "_get_mss",
+            return_value=make_mss(Image.new("RGB", (1512, 982), (255, 0, 0))),
+        ),
+    ):
+        img = decode((await computer_tool.screenshot()).base64_image)
+    assert img.format == "PNG"
+    assert img.mode == "RGB"
+    assert img.size == (1280, 800)
+    assert img.getpixel((640, 400)) == (255, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_computer_tool_screenshot_png_palette(mock_pyautogui, monkeypatch):
+    monkeypatch.setenv("CUD_SCREENSHOT_FMT", "png")
+    monkeypatch.setenv("CUD_PALETTE", "1")
+    computer_tool = ComputerTool()
+    with (
+        patch("computer_use_demo.tools.computer.Quartz", None),
+        patch.object(
+            computer_tool,
+            "_get_mss",
+            return_value=make_mss(Image.new("RGB", (1512, 982), (0, 0, 255))),
+        ),
+    ):
+        img = decode((await computer_tool.screenshot()).base64_image)
+    assert img.format == "PNG"
+    assert img.mode == "P"
+    assert img.convert("RGB").getpixel((640, 400)) == (0, 0, 255)
+
+
+def test_computer_tool_screenshot_skips_resize_at_target_size(
+    computer_tool, capture_frame
+):
+    capture_frame(Image.new("RGB", (1280, 800), (0, 255, 0)))
+    with patch.object(Image.Image, "resize", side_effect=AssertionError):
+        img = decode(computer_tool._screenshot_sync())
+    assert img.size == (1280, 800)
+
+
+def test_computer_tool_screenshot_reuses_buffer(computer_tool, capture_frame):
+    frame = Image.new("RGB", (1512, 982), (0, 128, 255))
+    capture_frame(frame)
+    first = computer_tool._screenshot_sync()
+    assert computer_tool._screenshot_sync() == first
+
+    # a larger encode must not leave stale bytes behind for a smaller one
+    capture_frame(Image.effect_noise((1512, 982), 100).convert("RGB"))
+    assert len(computer_tool._screenshot_sync()) > len(first)
+    capture_frame(frame)
+    assert computer_tool._screenshot_sync() == first
+
+
+def test_computer_tool_screenshot_options(mock_pyautogui, monkeypatch):
+    monkeypatch.setenv("CUD_SCREENSHOT_FMT", "Png")
+    monkeypatch.setenv("CUD_RESAMPLE", "box")
+    computer_tool = ComputerTool()
+    assert computer_tool._screenshot_format == "PNG"
+    assert computer_tool._resample == Image.Resampling.BOX
+
+
+@pytest.mark.parametrize(
+    "env, match",
+    [
+        ({"CUD_SCREENSHOT_FMT": "webp"}, "Unsupported screenshot format: WEBP"),
+        ({"CUD_RESAMPLE": "cubic"}, "Unsupported resampling filter: CUBIC"),
+    ],
+)
+def test_computer_tool_invalid_screenshot_options(
+    mock_pyautogui, monkeypatch, env, match
+):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    with pytest.raises(ToolError, match=match):
+        ComputerTool()
+
+
+# CoreGraphics bitmap info constants
+kCGBitmapByteOrder32Little = 0x2000
+kCGBitmapByteOrder32Big = 0x4000
+kCGImageAlphaPremultipliedLast = 1
+kCGImageAlphaPremultipliedFirst = 2
+kCGImageAlphaNoneSkipFirst = 6
+
+
+def make_quartz(
+    frame: Image.Image | None,
+    bitmap_info: int = kCGBitmapByteOrder32Little | kCGImageAlphaPremultipliedFirst,
+    bits_per_pixel: int = 32,
+    window_image: bool = True,
+):
+    """A Quartz stand-in whose captures return frame as padded BGRA rows."""
+    quartz = MagicMock(
+        kCGBitmapByteOrderMask=0x7000,
+        kCGBitmapByteOrder32Little=kCGBitmapByteOrder32Little,
+        kCGBitmapAlphaInfoMask=0x1F,
+        kCGImageAlphaPremultipliedFirst=kCGImageAlphaPremultipliedFirst,
+        kCGImageAlphaFirst=4,
+        kCGImageAlphaNoneSkipFirst=kCGImageAlphaNoneSkipFirst,
+    )
+    image_ref = object() if frame is not None else None
+    quartz.CGWindowListCreateImage.return_value = image_ref if window_image else None
+    quartz.CGDisplayCreateImage.return_value = image_ref
+    quartz.CGImageGetBitmapInfo.return_value = bitmap_info
+    quartz.CGImageGetBitsPerPixel.return_value = bits_per_pixel
+    if frame is not None:
+        width, height = frame.size
+        stride = width * 4 + 16  # CoreGraphics pads rows
+        bgra = frame.convert("RGBA").tobytes("raw", "BGRA")
+        quartz.CGDataProviderCopyData.return_value = b"".join(
+            bgra[y * width * 4 : (y + 1) * width * 4] + b"\0" * 16
+            for y in range(height)
+        )
+        quartz.CGImageGetWidth.return_value = width
+        quartz.CGImageGetHeight.return_value = height
+        quartz.CGImageGetBytesPerRow.return_value = stride
+    return quartz
+
+
+@pytest.mark.parametrize("window_image", [True, False])
+def test_computer_tool_capture_macos(computer_tool, window_image):
+    frame = Image.new("RGB", (64, 32), (255, 0, 0))
+    frame.putpixel((63, 31), (0, 0, 255))
+    quartz = make_quartz(frame, window_image=window_image)
+    with patch("computer_use_demo.tools.computer.Quartz", quartz):
+        img = computer_tool._capture_macos()
+
+    assert img is not None
+    assert img.mode == "RGB"
+    assert img.size == (64, 32)
+    assert img.getpixel((0, 0)) == (255, 0, 0)
+    assert img.getpixel((63, 31)) == (0, 0, 255)
+    # falls back to the display image only if the window list capture fails
+    assert quartz.CGDisplayCreateImage.called is not window_image
+
+
+@pytest.mark.parametrize(
+    "quartz",
+    [
+        None,
+        make_quartz(None),
+        # ARGB, RGBA and RGBX byte orders
+        make_quartz(
+            Image.new("RGB", (8, 8)),
+            kCGBitmapByteOrder32Big | kCGImageAlphaPremultipliedFirst,
+        ),
+        make_quartz(
+            Image.new("RGB", (8, 8)),
+            kCGBitmapByteOrder32Big | kCGImageAlphaPremultipliedLast,
+        ),
+        make_quartz(
+            Image.new("RGB", (8, 8)),
+            kCGBitmapByteOrder32Little | kCGImageAlphaPremultipliedLast,
+        ),
+        make_quartz(
+            Image.new("RGB", (8, 8)),
+            kCGBitmapByteOrder32Little | kCGImageAlphaNoneSkipFirst,
+            bits_per_pixel=64,
+        ),
+    ],
+    ids=["no-quartz", "no-image", "argb", "rgba", "abgr", "64bpp"],
+)
+def test_computer_tool_capture_macos_falls_back_to_mss(computer_tool, quartz):
+    frame = Image.new("RGB", (1280, 800), (0, 255, 0))
+    with (
+        patch("computer_use_demo.tools.computer.Quartz", quartz),
+        patch.object(computer_tool, "_get_mss", return_value=make_mss(frame)),
+    ):
+        assert computer_tool._capture_macos() is None
+        img = decode(computer_tool._screenshot_sync())
+    assert img.size == (1280, 800)
+    r, g, b = img.getpixel((640, 400))
+    assert r < 15 and g > 240 and b < 15
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from computer_use_demo.tools.run import TRUNCATED_MESSAGE, maybe_truncate, run
+
+
+@pytest.mark.asyncio
+async def test_run_shell_exec_fast_path():
+    returncode, stdout, stderr = await run("echo Hello World", shell=False)
+    assert returncode == 0
+    assert stdout == "Hello World\n"
+    assert stderr == ""
+
+
+@pytest.mark.asyncio
+async def test_run_shell_falls_back_to_shell():
+    # metacharacters and builtins still need a real shell
+    _, stdout, _ = await run("echo first && echo second", shell=False)
+    assert stdout == "first\nsecond\n"
+
+    returncode, _, _ = await run("cd /", shell=False)
+    assert returncode == 0
+
+
+@pytest.mark.asyncio
+async def test_run_shell_exec_errors_fall_back_to_shell(tmp_path):
+    script = tmp_path / "noexec.sh"
+    script.write_text("echo hi\n")
+    script.chmod(0o644)
+
+    for cmd in (str(script), str(tmp_path)):
+        returncode, stdout, stderr = await run(cmd, shell=False)
+        assert returncode == 126
+        assert stdout == ""
+        assert stderr
+
+
+@pytest.mark.asyncio
+async def test_run_sync_callable():
+    assert await run(lambda a, b: a + b, 1, 2) == 3
+
+
+@pytest.mark.asyncio
+async def test_run_shell_caps_output():
+    _, stdout, _ = await run("yes | head -c 1000000", truncate_after=100)
+    assert stdout == "y\n" * 50 + TRUNCATED_MESSAGE
+
+
+@pytest.mark.asyncio
+async def test_run_shell_truncation_keeps_returncode_and_stderr():
+    returncode, stdout, stderr = await run(
+        "seq 1 200000; echo IMPORTANT_ERR >&2; exit 0", truncate_after=100
+    )
+    assert returncode == 0
+    assert stdout.endswith(TRUNCATED_MESSAGE)
+    assert stderr == "IMPORTANT_ERR\n"
+
+
+def test_maybe_truncate():
+    assert maybe_truncate("hello", truncate_after=10) == "hello"
+    assert maybe_truncate("hello", truncate_after=2) == "he" + TRUNCATED_MESSAGE
+    assert maybe_truncate(b"hello", truncate_after=10) == "hello"
+    assert maybe_truncate(b"hello", truncate_after=2) == "he" + TRUNCATED_MESSAGE
+    assert maybe_truncate(b"hello", truncate_after=None) == "hello"
+
+
+@pytest.mark.asyncio
+async def test_run_sync_callable_inline():
+    assert await run(lambda a, b: a + b, 1, 2, inline=True) == 3
+
+    # inline calls stay on the event loop thread; the default path uses a worker
+    assert await run(threading.current_thread, inline=True) is threading.main_thread()
+    assert await run(threading.current_thread) is not threading.main_thread()